@@ -3,12 +3,49 @@
 Скрипт для сравнения аудио характеристик оригинального и обработанного файлов.
 Помогает увидеть различия в обработке.
 """
-import subprocess
+import asyncio
+import os
+import re
 import sys
+from collections import OrderedDict
+from functools import wraps
 from pathlib import Path
 
+# Сколько результатов ffprobe/volumedetect хранить в кэше
+_CACHE_SIZE = 32
 
-def get_audio_info(file_path: str) -> dict:
+# Итоговые строки volumedetect; stderr разбираем как bytes, без декодирования
+_MEAN_B = re.compile(rb'mean_volume:\s*(-?[\d.]+)\s*dB')
+_MAX_B = re.compile(rb'max_volume:\s*(-?[\d.]+)\s*dB')
+
+
+def _cached_by_mtime(func):
+    """
+    Кэширует результат корутины по (путь, st_mtime_ns) - аналог lru_cache для async.
+    
+    Повторные сравнения неизменённого файла не запускают процессы заново,
+    а любое изменение файла (новый mtime) сбрасывает кэш для него.
+    """
+    cache = OrderedDict()
+    
+    @wraps(func)
+    async def wrapper(file_path: str) -> dict:
+        key = (file_path, os.stat(file_path).st_mtime_ns)
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        
+        result = await func(file_path)
+        cache[key] = result
+        if len(cache) > _CACHE_SIZE:
+            cache.popitem(last=False)
+        return result
+    
+    return wrapper
+
+
+@_cached_by_mtime
+async def get_audio_info(file_path: str) -> dict:
     """Получает информацию об аудио через ffprobe."""
     cmd = [
         "ffprobe", "-v", "error",
@@ -18,46 +55,53 @@ def get_audio_info(file_path: str) -> dict:
         file_path
     ]
     
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL
+    )
+    stdout, _ = await proc.communicate()
+    if proc.returncode != 0:
         return {}
     
     import json
-    data = json.loads(result.stdout)
+    data = json.loads(stdout)
     if data.get('streams'):
         return data['streams'][0]
     return {}
 
 
-def get_volume_stats(file_path: str) -> dict:
+@_cached_by_mtime
+async def get_volume_stats(file_path: str) -> dict:
     """Получает статистику громкости через volumedetect."""
+    # -nostats/-hide_banner: без строк прогресса и баннера, поэтому stderr
+    # остаётся маленьким (информация о потоках и итоги volumedetect)
     cmd = [
-        "ffmpeg", "-i", file_path,
+        "ffmpeg", "-nostats", "-hide_banner", "-i", file_path,
         "-af", "volumedetect",
         "-f", "null", "-"
     ]
     
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
+    _, stderr = await proc.communicate()
     
+    # Два поиска по всему буферу вместо разбора построчно
     stats = {}
-    for line in result.stderr.split('\n'):
-        if 'mean_volume:' in line:
-            try:
-                value = float(line.split('mean_volume:')[1].split('dB')[0].strip())
-                stats['mean_volume'] = value
-            except:
-                pass
-        elif 'max_volume:' in line:
-            try:
-                value = float(line.split('max_volume:')[1].split('dB')[0].strip())
-                stats['max_volume'] = value
-            except:
-                pass
+    mean_match = _MEAN_B.search(stderr)
+    if mean_match:
+        stats['mean_volume'] = float(mean_match.group(1))
+    max_match = _MAX_B.search(stderr)
+    if max_match:
+        stats['max_volume'] = float(max_match.group(1))
     
     return stats
 
 
-def compare_files(original: str, processed: str):
+async def compare_files(original: str, processed: str):
     """Сравнивает два аудио файла."""
     print("=" * 70)
     print("СРАВНЕНИЕ АУДИО ФАЙЛОВ")
@@ -65,9 +109,16 @@ def compare_files(original: str, processed: str):
     print(f"\nОригинал: {original}")
     print(f"Обработанный: {processed}\n")
     
+    # Все четыре вызова ffprobe/ffmpeg независимы - запускаем их одновременно
+    # в одном event loop, без потока на каждый процесс
+    orig_info, proc_info, orig_vol, proc_vol = await asyncio.gather(
+        get_audio_info(original),
+        get_audio_info(processed),
+        get_volume_stats(original),
+        get_volume_stats(processed)
+    )
+    
     # Метаданные
-    orig_info = get_audio_info(original)
-    proc_info = get_audio_info(processed)
     
     print("МЕТАДАННЫЕ:")
     print(f"  Кодек: {orig_info.get('codec_name', 'N/A')} → {proc_info.get('codec_name', 'N/A')}")
@@ -75,9 +126,6 @@ def compare_files(original: str, processed: str):
     print(f"  Каналы: {orig_info.get('channels', 'N/A')} → {proc_info.get('channels', 'N/A')}")
     
     # Громкость
-    orig_vol = get_volume_stats(original)
-    proc_vol = get_volume_stats(processed)
-    
     print("\nГРОМКОСТЬ:")
     if 'mean_volume' in orig_vol and 'mean_volume' in proc_vol:
         diff = proc_vol['mean_volume'] - orig_vol['mean_volume']
@@ -132,4 +180,4 @@ if __name__ == '__main__':
         print(f"Ошибка: файл не найден: {processed}")
         sys.exit(1)
     
-    compare_files(original, processed)
+    asyncio.run(compare_files(original, processed))
@@ -9,6 +9,14 @@
 - Default: сбалансированная обработка для большинства случаев
 - Aggressive: максимальное улучшение разборчивости, может добавить артефакты
 
+Необязательные флаги пресета:
+- uses_silence: анализ ищет участки тишины (silencedetect). По умолчанию
+  выключен - ни цепочка фильтров, ни оценка шума от участков тишины не зависят
+- static: фиксированные параметры фильтров, анализ аудио не выполняется
+  (build_audio_filter получает пустой анализ и использует уровни по умолчанию).
+  Сила afftdn и компенсация громкости зависят от анализа, поэтому флаг меняет
+  результат; встроенные пресеты его не используют
+
 Ограничения:
 - Не работает хорошо на аудио с очень громкой музыкой
 - Может исказить музыку, если она важна
@@ -5,19 +5,37 @@
 Не требует внешних зависимостей типа python-dotenv.
 """
 import os
+import re
 import logging
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 
 logger = logging.getLogger(__name__)
 
+# Одна строка .env: KEY=value, KEY="value" или KEY='value'
+# с необязательным комментарием в конце (" # ..."). '#' считается началом
+# комментария, только если перед ним есть пробел (в том числе сразу после
+# '=': "KEY= # ..." даёт пустое значение). Кавычки снимаются по первому и
+# последнему символу значения, как и раньше: KEY="a\"b" даёт a\"b
+_ENV_LINE_RE = re.compile(
+    r'^[ \t]*([A-Za-z_][A-Za-z0-9_]*)[ \t]*=[ \t]*'
+    r'(?:"([^\n]*)"|\'([^\n]*)\'|([^\n]*?))'
+    r'[ \t]*(?:(?<=[ \t])#[^\n]*)?\r?$',
+    re.MULTILINE
+)
+
+# st_mtime_ns уже загруженных .env файлов: неизменённый файл повторно не читаем
+_loaded_mtimes: Dict[Path, int] = {}
+
 
 def load_env_file(env_path: Optional[str] = None) -> None:
     """
     Загружает переменные из .env файла в окружение.
     
     Использует только стандартную библиотеку Python.
-    Формат файла: KEY=value (по одной переменной на строку)
+    Формат файла: KEY=value (по одной переменной на строку), значение может
+    быть в кавычках, допускаются комментарии (# ...) в конце строки.
+    Повторный вызов для файла с тем же mtime ничего не делает
     
     Args:
         env_path: Путь к .env файлу. Если None, ищет .env в текущей директории.
@@ -27,42 +45,39 @@ def load_env_file(env_path: Optional[str] = None) -> None:
     else:
         env_path = Path(env_path)
     
-    if not env_path.exists():
+    try:
+        mtime_ns = env_path.stat().st_mtime_ns
+    except OSError:
         logger.debug(f"Файл .env не найден: {env_path}, используем переменные окружения системы")
         return
     
+    if _loaded_mtimes.get(env_path) == mtime_ns:
+        logger.debug(f"Файл .env не изменился с последней загрузки: {env_path}")
+        return
+    
     logger.debug(f"Загрузка переменных из .env: {env_path}")
     
     try:
-        with open(env_path, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                line = line.strip()
-                
-                # Пропускаем пустые строки и комментарии
-                if not line or line.startswith('#'):
-                    continue
-                
-                # Парсим KEY=value
-                if '=' not in line:
-                    logger.warning(f"Строка {line_num} в .env пропущена (нет '='): {line}")
-                    continue
-                
-                key, value = line.split('=', 1)
-                key = key.strip()
-                value = value.strip()
-                
-                # Убираем кавычки, если есть
-                if value.startswith('"') and value.endswith('"'):
-                    value = value[1:-1]
-                elif value.startswith("'") and value.endswith("'"):
-                    value = value[1:-1]
-                
-                # Устанавливаем переменную окружения только если её ещё нет
-                # (системные переменные имеют приоритет)
-                if key and key not in os.environ:
-                    os.environ[key] = value
-                    logger.debug(f"Загружена переменная: {key}")
+        content = env_path.read_text(encoding='utf-8')
+        
+        # Один проход regex по всему файлу; пустые строки, комментарии
+        # и строки без '=' просто не дают совпадений
+        for match in _ENV_LINE_RE.finditer(content):
+            key, double_quoted, single_quoted, bare = match.groups()
+            if double_quoted is not None:
+                value = double_quoted
+            elif single_quoted is not None:
+                value = single_quoted
+            else:
+                value = bare
+            
+            # Устанавливаем переменную окружения только если её ещё нет
+            # (системные переменные имеют приоритет)
+            if key not in os.environ:
+                os.environ[key] = value
+                logger.debug(f"Загружена переменная: {key}")
         
+        _loaded_mtimes[env_path] = mtime_ns
         logger.info(f"Переменные из .env загружены успешно")
         
     except Exception as e:
@@ -6,14 +6,18 @@
 """
 import argparse
 import logging
+import os
 import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 
 from pipeline.probe import get_streams_info, NoAudioStreamError, InvalidMediaFileError
 from pipeline.analysis import analyze_audio
-from pipeline.filters import build_audio_filter
-from pipeline.process import process_video
+from pipeline.filters import build_audio_filter, analysis_signature
+from pipeline.process import process_video, FFMPEG_THREADS
 from config import get_preset
 from pipeline.ffmpeg import FFmpegError
 from env_config import load_env_file, get_env, ENV_LOG_LEVEL, ENV_DEFAULT_PRESET
@@ -32,6 +36,212 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Расширения файлов, которые считаются видео
+VIDEO_EXTENSIONS = frozenset({'.mp4', '.avi', '.mov', '.mkv', '.flv', '.webm', '.m4v'})
+
+# Кэш цепочек фильтров: (имя пресета, сигнатура анализа) -> цепочка.
+# Для серии похожих файлов (подкасты, лекции) цепочка строится один раз
+_filter_cache: Dict[tuple, str] = {}
+
+
+def _init_worker(log_level: int) -> None:
+    """Переносит уровень логирования в процесс-воркер (важно для spawn на macOS/Windows)."""
+    logging.getLogger().setLevel(log_level)
+
+
+def _prepare_one(
+    video_file: Path,
+    preset: dict,
+    preset_name: str,
+    output_dir: Path,
+    timestamp: str
+) -> Tuple[Path, str]:
+    """
+    Шаги 1-3 пайплайна: probe → analysis → filters.
+    
+    Args:
+        video_file: Путь к входному видеофайлу
+        preset: Параметры пресета из config.py
+        preset_name: Имя пресета (добавляется к имени выходного файла)
+        output_dir: Директория для сохранения результата
+        timestamp: Метка времени запуска для имени выходного файла
+    
+    Returns:
+        Кортеж (путь к выходному файлу, цепочка фильтров)
+    """
+    logger.info(f"\n{'='*60}")
+    logger.info(f"Обработка файла: {video_file.name}")
+    logger.info(f"{'='*60}")
+    
+    # Шаг 1: Извлечение метаданных
+    logger.info("Шаг 1: Извлечение метаданных...")
+    probe_info = get_streams_info(video_file)
+    logger.debug(f"Метаданные: {probe_info}")
+    
+    # Шаг 2: Анализ аудио
+    if preset.get('static', False):
+        # Статический пресет: цепочка фильтров фиксирована, анализ не нужен
+        logger.info("Шаг 2: Анализ аудио пропущен (статический пресет)")
+        analysis = {}
+    else:
+        logger.info("Шаг 2: Анализ аудио...")
+        analysis = analyze_audio(
+            video_file,
+            probe_info,
+            need_silence=preset.get('uses_silence', False)
+        )
+        logger.debug(f"Результаты анализа: {analysis}")
+    
+    # Шаг 3: Построение цепочки фильтров
+    logger.info("Шаг 3: Построение цепочки фильтров...")
+    cache_key = (preset_name, analysis_signature(analysis))
+    filter_chain = _filter_cache.get(cache_key)
+    if filter_chain is None:
+        filter_chain = build_audio_filter(analysis, preset)
+        _filter_cache[cache_key] = filter_chain
+    else:
+        logger.debug("Цепочка фильтров взята из кэша")
+    logger.debug(f"Цепочка фильтров: {filter_chain}")
+    
+    # Добавляем пресет и timestamp к имени файла для различения версий
+    # Формат: original_name_[preset]_YYYY-MM-DD_HH-MM-SS.ext
+    file_stem = video_file.stem
+    file_suffix = video_file.suffix
+    output_filename = f"{file_stem}_{preset_name}_{timestamp}{file_suffix}"
+    output_file = output_dir / output_filename
+    
+    return output_file, filter_chain
+
+
+def _encode_one(
+    video_file: Path,
+    output_file: Path,
+    filter_chain: str,
+    threads: int = FFMPEG_THREADS
+) -> None:
+    """
+    Шаг 4 пайплайна: применение фильтров (кодирование ffmpeg).
+    
+    threads передаётся в process_video(): 0 - ffmpeg сам выбирает число
+    потоков (единственный файл), FFMPEG_THREADS - при пакетной обработке.
+    """
+    logger.info(f"Шаг 4: Применение фильтров ({video_file.name})...")
+    process_video(video_file, output_file, filter_chain, threads=threads)
+    logger.info(f"✓ Успешно обработан: {video_file.name}")
+
+
+def _report_failure(video_file: Path, e: Exception) -> Tuple[str, bool, Optional[str]]:
+    """
+    Логирует ошибку обработки файла с учётом её типа.
+    
+    Returns:
+        Кортеж результата для неуспешного файла (имя, False, текст ошибки)
+    """
+    if isinstance(e, FileNotFoundError):
+        logger.error(f"✗ Файл не найден: {e}")
+    elif isinstance(e, NoAudioStreamError):
+        logger.error(f"✗ Файл не содержит аудио потока: {e}")
+        logger.warning(f"  Пропускаем файл: {video_file.name}")
+    elif isinstance(e, InvalidMediaFileError):
+        logger.error(f"✗ Невалидный или повреждённый файл: {e}")
+    elif isinstance(e, ValueError):
+        logger.error(f"✗ Ошибка валидации: {e}")
+    elif isinstance(e, FFmpegError):
+        logger.error(f"✗ Ошибка ffmpeg: {e}")
+        logger.debug("  Проверьте, что ffmpeg установлен и файл не повреждён")
+    else:
+        logger.error(f"✗ Неожиданная ошибка при обработке {video_file.name}: {e}", exc_info=e)
+    
+    return video_file.name, False, str(e)
+
+
+def _process_one(
+    video_file: Path,
+    preset: dict,
+    preset_name: str,
+    output_dir: Path,
+    timestamp: str,
+    threads: int = FFMPEG_THREADS
+) -> Tuple[str, bool, Optional[str]]:
+    """
+    Прогоняет один видеофайл через весь пайплайн: probe → analysis → filters → process.
+    
+    Выполняется в процессе-воркере, поэтому все ошибки перехватываются здесь
+    и возвращаются в виде результата, а не пробрасываются в главный процесс.
+    
+    Args:
+        video_file: Путь к входному видеофайлу
+        preset: Параметры пресета из config.py
+        preset_name: Имя пресета (добавляется к имени выходного файла)
+        output_dir: Директория для сохранения результата
+        timestamp: Метка времени запуска для имени выходного файла
+        threads: Число потоков ffmpeg (0 - ffmpeg выбирает сам)
+    
+    Returns:
+        Кортеж (имя файла, успех, текст ошибки или None)
+    """
+    try:
+        output_file, filter_chain = _prepare_one(video_file, preset, preset_name, output_dir, timestamp)
+        _encode_one(video_file, output_file, filter_chain, threads)
+        return video_file.name, True, None
+    except Exception as e:
+        return _report_failure(video_file, e)
+
+
+def _process_pipelined(
+    video_files: List[Path],
+    preset: dict,
+    preset_name: str,
+    output_dir: Path,
+    timestamp: str
+) -> List[Tuple[str, bool, Optional[str]]]:
+    """
+    Обрабатывает файлы в одном процессе с перекрытием этапов.
+    
+    Пока фоновый поток ждёт ffmpeg, кодирующий текущий файл, главный поток
+    выполняет probe и анализ следующего. Используется, когда параллельных
+    процессов всего один: так время подготовки прячется за кодированием.
+    
+    Returns:
+        Результаты в формате _process_one() в порядке файлов
+    """
+    results = []
+    # (файл, future) кодирования, которое идёт в фоне
+    pending = None
+    
+    with ThreadPoolExecutor(max_workers=1) as encoder:
+        for video_file in video_files:
+            try:
+                job = (video_file,) + _prepare_one(video_file, preset, preset_name, output_dir, timestamp)
+                failure = None
+            except Exception as e:
+                job = None
+                failure = e
+            
+            # Следующий файл подготовлен - дожидаемся кодирования предыдущего
+            if pending is not None:
+                results.append(_wait_encode(*pending))
+                pending = None
+            
+            if job is not None:
+                pending = (video_file, encoder.submit(_encode_one, *job))
+            else:
+                results.append(_report_failure(video_file, failure))
+        
+        if pending is not None:
+            results.append(_wait_encode(*pending))
+    
+    return results
+
+
+def _wait_encode(video_file: Path, future: Future) -> Tuple[str, bool, Optional[str]]:
+    """Дожидается фонового кодирования и превращает его исход в результат."""
+    try:
+        future.result()
+        return video_file.name, True, None
+    except Exception as e:
+        return _report_failure(video_file, e)
+
 
 def main():
     """Основная функция CLI."""
@@ -104,11 +314,14 @@ def main():
         sys.exit(1)
     
     # Сканируем входную директорию на наличие видеофайлов
-    video_extensions = {'.mp4', '.avi', '.mov', '.mkv', '.flv', '.webm', '.m4v'}
-    video_files = [
-        f for f in input_dir.iterdir()
-        if f.is_file() and f.suffix.lower() in video_extensions
-    ]
+    # scandir отдаёт тип записи из самого каталога, без отдельного stat на каждый
+    # файл (stat выполняется только для символических ссылок - они тоже принимаются)
+    with os.scandir(input_dir) as entries:
+        video_files = [
+            Path(entry.path) for entry in entries
+            if entry.is_file()
+            and os.path.splitext(entry.name)[1].lower() in VIDEO_EXTENSIONS
+        ]
     
     if not video_files:
         logger.warning(f"Не найдено видеофайлов в директории: {input_dir}")
@@ -120,61 +333,46 @@ def main():
     processed_count = 0
     failed_count = 0
     
-    for video_file in video_files:
-        logger.info(f"\n{'='*60}")
-        logger.info(f"Обработка файла: {video_file.name}")
-        logger.info(f"{'='*60}")
+    # Одна метка времени на весь запуск: выходные файлы одного пакета
+    # получают одинаковый суффикс и группируются при сортировке
+    batch_timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    
+    # Файлы независимы, поэтому обрабатываем их параллельно в нескольких процессах.
+    # Каждый ffmpeg ограничен FFMPEG_THREADS потоками, чтобы не перегружать ядра
+    max_workers = min(len(video_files), max(1, (os.cpu_count() or 1) // FFMPEG_THREADS))
+    
+    if len(video_files) == 1:
+        # Один файл - пул процессов не нужен, и ffmpeg может занять все ядра
+        results = [_process_one(video_files[0], preset, args.preset, output_dir, batch_timestamp, threads=0)]
+    elif max_workers == 1:
+        # Параллельных процессов не хватает - перекрываем этапы внутри одного процесса
+        logger.info("Параллельных процессов: 1 (подготовка следующего файла во время кодирования)")
+        results = _process_pipelined(video_files, preset, args.preset, output_dir, batch_timestamp)
+    else:
+        logger.info(f"Параллельных процессов: {max_workers}")
+        # Ленивый импорт: пул процессов (multiprocessing) нужен только здесь,
+        # а одиночный файл и конвейер из одного процесса обходятся без него
+        from concurrent.futures import ProcessPoolExecutor
         
-        try:
-            # Шаг 1: Извлечение метаданных
-            logger.info("Шаг 1: Извлечение метаданных...")
-            probe_info = get_streams_info(str(video_file))
-            logger.debug(f"Метаданные: {probe_info}")
-            
-            # Шаг 2: Анализ аудио
-            logger.info("Шаг 2: Анализ аудио...")
-            analysis = analyze_audio(str(video_file), probe_info)
-            logger.debug(f"Результаты анализа: {analysis}")
-            
-            # Шаг 3: Построение цепочки фильтров
-            logger.info("Шаг 3: Построение цепочки фильтров...")
-            filter_chain = build_audio_filter(analysis, preset)
-            logger.debug(f"Цепочка фильтров: {filter_chain}")
-            
-            # Шаг 4: Обработка видео
-            logger.info("Шаг 4: Применение фильтров...")
-            # Добавляем пресет и timestamp к имени файла для различения версий
-            # Формат: original_name_[preset]_YYYY-MM-DD_HH-MM-SS.ext
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            preset_name = args.preset
-            file_stem = video_file.stem
-            file_suffix = video_file.suffix
-            output_filename = f"{file_stem}_{preset_name}_{timestamp}{file_suffix}"
-            output_file = output_dir / output_filename
-            process_video(str(video_file), str(output_file), filter_chain)
-            
-            logger.info(f"✓ Успешно обработан: {video_file.name}")
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(logging.getLogger().level,)
+        ) as executor:
+            results = list(executor.map(
+                _process_one,
+                video_files,
+                repeat(preset),
+                repeat(args.preset),
+                repeat(output_dir),
+                repeat(batch_timestamp),
+                chunksize=1
+            ))
+    
+    for _name, ok, _error in results:
+        if ok:
             processed_count += 1
-            
-        except FileNotFoundError as e:
-            logger.error(f"✗ Файл не найден: {e}")
-            failed_count += 1
-        except NoAudioStreamError as e:
-            logger.error(f"✗ Файл не содержит аудио потока: {e}")
-            logger.warning(f"  Пропускаем файл: {video_file.name}")
-            failed_count += 1
-        except InvalidMediaFileError as e:
-            logger.error(f"✗ Невалидный или повреждённый файл: {e}")
-            failed_count += 1
-        except ValueError as e:
-            logger.error(f"✗ Ошибка валидации: {e}")
-            failed_count += 1
-        except FFmpegError as e:
-            logger.error(f"✗ Ошибка ffmpeg: {e}")
-            logger.debug("  Проверьте, что ffmpeg установлен и файл не повреждён")
-            failed_count += 1
-        except Exception as e:
-            logger.error(f"✗ Неожиданная ошибка при обработке {video_file.name}: {e}", exc_info=True)
+        else:
             failed_count += 1
     
     # Итоговая статистика
@@ -12,21 +12,46 @@
 - Эвристика определения музыки основана на спектральных характеристиках
 """
 import logging
+import mmap
+import os
 import re
-from typing import Dict, List, Tuple, Optional
+import tempfile
+from functools import lru_cache
+from itertools import starmap
+from operator import sub
+from typing import Dict, List, Tuple, Optional, Union
 
 from .ffmpeg import run_ffmpeg, FFmpegError
 
 logger = logging.getLogger(__name__)
 
+# Регулярные выражения компилируются один раз при импорте модуля.
+# Bytes-шаблоны: отчёт ffmpeg разбирается прямо из mmap, без декодирования
+# silencedetect: "silence_start: 1.234" / "silence_end: 5.678 | silence_duration: 4.444"
+_SD_RE_B = re.compile(rb'silence_(start|end):\s*([\d.]+)')
+# volumedetect: "mean_volume: -20.5 dB" / "max_volume: -3.1 dB"
+_MEAN_RE_B = re.compile(rb'mean_volume:\s*([-\d.]+)\s*dB')
+_MAX_RE_B = re.compile(rb'max_volume:\s*([-\d.]+)\s*dB')
+# astats (итоговая статистика): "RMS trough dB: -62.4"; для цифровой тишины
+# astats печатает "-inf"
+_RMS_RE_B = re.compile(rb'RMS trough dB:\s*(-?(?:[\d.]+|inf))')
 
-def analyze_audio(path: str, probe_info: dict) -> dict:
+# Нижняя граница оценки шума в dB
+_NOISE_FLOOR_MIN_DB = -60.0
+
+# Уровень журнала в файле отчёта: 32 = info, на нём пишут все три фильтра
+_REPORT_LEVEL = 32
+
+
+def analyze_audio(path: Union[str, os.PathLike], probe_info: dict, need_silence: bool = True) -> dict:
     """
     Анализирует аудио для определения параметров фильтрации.
     
     Args:
-        path: Путь к медиафайлу
+        path: Путь к медиафайлу (str или Path)
         probe_info: Результат get_streams_info() с метаданными
+        need_silence: Нужны ли участки тишины. Если False, silencedetect
+            не запускается, а silence_ratio равен None (не измерялся)
     
     Returns:
         Словарь с результатами анализа:
@@ -34,26 +59,32 @@ def analyze_audio(path: str, probe_info: dict) -> dict:
             'noise_level_db': float,      # Уровень фонового шума в dB
             'speech_level_db': float,     # Уровень речи в dB
             'has_music': bool,            # Присутствует ли музыка (эвристика)
-            'silence_ratio': float,       # Доля тишины в файле (0-1)
+            'silence_ratio': Optional[float],  # Доля тишины в файле (0-1)
             'silence_segments': List[Tuple[float, float]]  # Список (start, end) тишины
         }
     """
+    path = os.fspath(path)
     logger.info(f"Анализ аудио: {path}")
     
-    # Находим участки тишины
-    silence_segments = _detect_silence(path)
+    # Один проход ffmpeg: silencedetect (если нужен) + astats + volumedetect
+    levels = _run_combined_analysis(path, need_silence=need_silence)
+    silence_segments = levels['silence_segments']
     
-    # Вычисляем долю тишины
-    duration = probe_info.get('audio', {}).get('duration') or probe_info.get('format', {}).get('duration')
-    silence_ratio = _calculate_silence_ratio(silence_segments, duration)
+    if need_silence:
+        # Вычисляем долю тишины
+        duration = probe_info.get('audio', {}).get('duration') or probe_info.get('format', {}).get('duration')
+        silence_ratio = _calculate_silence_ratio(silence_segments, duration)
+        logger.debug(f"Найдено участков тишины: {len(silence_segments)}, доля: {silence_ratio:.2%}")
+    else:
+        # volumedetect/astats не дают временной картины, долю тишины по ним не оценить
+        silence_ratio = None
+        logger.debug("Детекция тишины пропущена: пресет не использует участки тишины")
     
-    logger.debug(f"Найдено участков тишины: {len(silence_segments)}, доля: {silence_ratio:.2%}")
-    
-    # Оцениваем уровень шума из участков тишины
-    noise_level_db = _estimate_noise_level(path, silence_segments)
+    # Оцениваем уровень фонового шума по статистике astats
+    noise_level_db = _estimate_noise_level(levels)
     
     # Оцениваем уровень речи из не-тихих участков
-    speech_level_db = _estimate_speech_level(path, silence_segments, duration)
+    speech_level_db = _estimate_speech_level(levels)
     
     # Эвристика определения музыки
     has_music = _detect_music(noise_level_db, speech_level_db, silence_ratio)
@@ -69,80 +100,189 @@ def analyze_audio(path: str, probe_info: dict) -> dict:
     logger.info(
         f"Результаты анализа: шум={noise_level_db:.1f}dB, "
         f"речь={speech_level_db:.1f}dB, музыка={has_music}, "
-        f"тишина={silence_ratio:.1%}"
+        f"тишина={'н/д' if silence_ratio is None else f'{silence_ratio:.1%}'}"
     )
     
     return result
 
 
-def _detect_silence(path: str, threshold: str = "-35dB", duration: float = 0.4) -> List[Tuple[float, float]]:
+def _run_combined_analysis(
+    path: str,
+    threshold: str = "-35dB",
+    duration: float = 0.4,
+    need_silence: bool = True
+) -> dict:
     """
-    Обнаруживает участки тишины в аудио с помощью silencedetect.
+    Выполняет весь анализ за один проход ffmpeg.
+    
+    silencedetect, astats и volumedetect соединены в одну цепочку фильтров,
+    поэтому файл демультиплексируется и декодируется один раз вместо трёх.
+    Результат кэшируется по (путь, mtime): повторный анализ неизменённого
+    файла не запускает ffmpeg.
     
     Args:
         path: Путь к медиафайлу
         threshold: Порог тишины в dB (по умолчанию -35dB)
         duration: Минимальная длительность тишины в секундах
+        need_silence: Включать ли silencedetect в цепочку
     
     Returns:
-        Список кортежей (start, end) для каждого участка тишины
+        Словарь с результатами разбора stderr:
+        {
+            'silence_segments': List[Tuple[float, float]],
+            'mean_volume': Optional[float],   # mean_volume из volumedetect
+            'max_volume': Optional[float],    # max_volume из volumedetect
+            'noise_floor': Optional[float]    # RMS trough из astats (Overall); None для -inf
+        }
     """
-    logger.debug(f"Детекция тишины: threshold={threshold}, duration={duration}")
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime_ns = None
     
     try:
-        # Используем silencedetect фильтр
-        # Формат: silencedetect=n=-35dB:d=0.4
-        cmd = [
-            "-i", path,
-            "-af", f"silencedetect=n={threshold}:d={duration}",
-            "-f", "null",
-            "-"
-        ]
-        
-        result = run_ffmpeg(cmd, log_level="error")
-        
-        # Парсим вывод silencedetect из stderr
-        # Формат: [silencedetect @ ...] silence_start: 1.234
-        #         [silencedetect @ ...] silence_end: 5.678 | silence_duration: 4.444
-        segments = _parse_silencedetect_output(result.stderr)
-        
-        return segments
-        
+        levels = _combined_analysis_pass(path, mtime_ns, threshold, duration, need_silence)
     except FFmpegError as e:
-        logger.warning(f"Ошибка при детекции тишины: {e}. Возвращаем пустой список.")
-        return []
+        # Ошибки не кэшируются (lru_cache не запоминает исключения)
+        logger.warning(f"Ошибка при анализе аудио: {e}. Используем консервативные оценки.")
+        return _parse_combined_output(b"")
+    
+    # Копируем список, чтобы изменения результата вызывающим кодом не портили кэш
+    return dict(levels, silence_segments=list(levels['silence_segments']))
 
 
-def _parse_silencedetect_output(stderr: str) -> List[Tuple[float, float]]:
+@lru_cache(maxsize=32)
+def _combined_analysis_pass(
+    path: str,
+    mtime_ns: Optional[int],
+    threshold: str,
+    duration: float,
+    need_silence: bool
+) -> dict:
     """
-    Парсит вывод silencedetect из stderr.
+    Запускает ffmpeg с цепочкой фильтров анализа и разбирает вывод.
+    
+    mtime_ns не используется внутри, но входит в ключ кэша: изменение
+    файла сбрасывает закэшированный результат.
+    
+    Raises:
+        FFmpegError: Если ffmpeg завершился с ошибкой
+    """
+    logger.debug(f"Комбинированный анализ: threshold={threshold}, duration={duration}, тишина={need_silence}")
+    
+    # Формат: silencedetect=n=-35dB:d=0.4,astats=...,volumedetect
+    analysis_filters = ["astats=reset=0", "volumedetect"]
+    if need_silence:
+        analysis_filters.insert(0, f"silencedetect=n={threshold}:d={duration}")
+    
+    # На уровне info ffmpeg печатает баннер и строку прогресса на каждом
+    # обновлении - отключаем их, оставляя только вывод фильтров анализа.
+    # -vn/-sn/-dn: видео, субтитры и данные не нужны - их не демультиплексируем
+    # и не декодируем
+    cmd = [
+        "-nostats",
+        "-hide_banner",
+        "-i", path,
+        "-vn", "-sn", "-dn",
+        "-af", ",".join(analysis_filters),
+        "-f", "null",
+        "-"
+    ]
+    
+    # Все три фильтра пишут результаты на уровне info. Вместо stderr ffmpeg
+    # пишет журнал этого уровня в файл отчёта (FFREPORT), а stderr остаётся
+    # на уровне error: Python не держит у себя мегабайты вывода, а файл
+    # разбирается через mmap - страницы подгружает ОС по мере поиска
+    fd, report_path = tempfile.mkstemp(prefix="vc-report-", suffix=".log")
+    os.close(fd)
+    try:
+        env = dict(os.environ, FFREPORT=f"file={_escape_report_path(report_path)}:level={_REPORT_LEVEL}")
+        run_ffmpeg(cmd, log_level="error", env=env)
+        
+        with open(report_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # Пустой файл нельзя отобразить в память
+                return _parse_combined_output(b"")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return _parse_combined_output(mm)
+    finally:
+        try:
+            os.unlink(report_path)
+        except OSError:
+            pass
+
+
+def _escape_report_path(path: str) -> str:
+    """
+    Экранирует путь для значения FFREPORT.
+    
+    ':' разделяет параметры, '\\' экранирует, а '%' начинает шаблон
+    имени (%p, %t), поэтому их нужно экранировать.
+    """
+    return path.replace('\\', '\\\\').replace(':', '\\:').replace('%', '%%')
+
+
+def _parse_combined_output(stderr) -> dict:
+    """
+    Разбирает журнал комбинированного прохода анализа.
     
     Args:
-        stderr: Вывод stderr от ffmpeg с silencedetect
+        stderr: Журнал ffmpeg с выводом silencedetect, astats и volumedetect
+            (bytes или mmap)
     
     Returns:
-        Список кортежей (start, end) для участков тишины
+        Словарь в формате _run_combined_analysis()
     """
-    segments = []
+    # Формат: [silencedetect @ ...] silence_start: 1.234
+    #         [silencedetect @ ...] silence_end: 5.678 | silence_duration: 4.444
+    silence_segments = _parse_silencedetect_output(stderr)
+    
+    mean_volume_match = _MEAN_RE_B.search(stderr)
+    max_volume_match = _MAX_RE_B.search(stderr)
+    
+    # astats печатает итоговую статистику по каждому каналу, затем секцию Overall,
+    # поэтому последнее совпадение относится ко всему потоку (-inf тоже должен
+    # совпадать, иначе последним окажется значение одного из каналов).
+    # RMS trough - минимальный RMS среди окон, то есть уровень самых тихих участков
+    rms_trough_matches = _RMS_RE_B.findall(stderr)
+    noise_floor = None
+    if rms_trough_matches and rms_trough_matches[-1] != b'-inf':
+        # -inf - цифровая тишина хотя бы в одном окне (тихое начало или конец
+        # файла, мёртвый канал): о фоновом шуме она ничего не говорит, поэтому
+        # уровень считается неизмеренным
+        noise_floor = max(float(rms_trough_matches[-1]), _NOISE_FLOOR_MIN_DB)
+    
+    return {
+        'silence_segments': silence_segments,
+        'mean_volume': float(mean_volume_match.group(1)) if mean_volume_match else None,
+        'max_volume': float(max_volume_match.group(1)) if max_volume_match else None,
+        'noise_floor': noise_floor
+    }
+
+
+def _parse_silencedetect_output(stderr) -> List[Tuple[float, float]]:
+    """
+    Парсит вывод silencedetect из журнала ffmpeg.
     
-    # Регулярные выражения для поиска меток тишины
-    silence_start_pattern = r'silence_start:\s*([\d.]+)'
-    silence_end_pattern = r'silence_end:\s*([\d.]+)'
+    Args:
+        stderr: Журнал ffmpeg с silencedetect (bytes или mmap)
     
+    Returns:
+        Список кортежей (start, end) для участков тишины
+    """
+    segments = []
     current_start = None
     
-    for line in stderr.split('\n'):
-        # Ищем начало тишины
-        match = re.search(silence_start_pattern, line)
-        if match:
-            current_start = float(match.group(1))
-            continue
-        
-        # Ищем конец тишины
-        match = re.search(silence_end_pattern, line)
-        if match and current_start is not None:
-            end = float(match.group(1))
-            segments.append((current_start, end))
+    # Один проход regex-движка по всему буферу вместо разбиения на строки;
+    # метки приходят по порядку, поэтому достаточно простого автомата
+    for match in _SD_RE_B.finditer(stderr):
+        kind, value = match.groups()
+        if kind == b'start':
+            # Начало тишины
+            current_start = float(value)
+        elif current_start is not None:
+            # Конец тишины
+            segments.append((current_start, float(value)))
             current_start = None
     
     # Если есть начало тишины, но нет конца, считаем что тишина до конца файла
@@ -165,107 +305,77 @@ def _calculate_silence_ratio(silence_segments: List[Tuple[float, float]], durati
     if not silence_segments or duration is None or duration == 0:
         return 0.0
     
-    total_silence = sum(end - start for start, end in silence_segments)
-    return min(total_silence / duration, 1.0)
+    # starmap(sub) вычисляет start - end для каждого участка целиком на уровне C,
+    # без кадра генератора на каждый кортеж (для тысяч участков заметно быстрее)
+    total_silence = -sum(starmap(sub, silence_segments))
+    return min(max(total_silence / duration, 0.0), 1.0)
 
 
-def _estimate_noise_level(path: str, silence_segments: List[Tuple[float, float]]) -> float:
+def _estimate_noise_level(levels: dict) -> float:
     """
-    Оценивает уровень фонового шума из участков тишины.
+    Оценивает уровень фонового шума.
+    
+    Оценка не зависит от того, запускался ли silencedetect: иначе один и тот
+    же файл получал бы разный уровень шума в зависимости от пресета.
     
     Args:
-        path: Путь к медиафайлу
-        silence_segments: Участки тишины для анализа
+        levels: Результат _run_combined_analysis()
     
     Returns:
         Уровень шума в dB (обычно отрицательное значение)
     """
-    if not silence_segments:
-        # Если нет участков тишины, используем volumedetect для оценки общего уровня
-        # и предполагаем, что шум на 20-30 dB ниже среднего уровня
-        try:
-            cmd = ["-i", path, "-af", "volumedetect", "-f", "null", "-"]
-            result = run_ffmpeg(cmd, log_level="error")
-            
-            # Парсим mean_volume из stderr
-            mean_volume_match = re.search(r'mean_volume:\s*([-\d.]+)\s*dB', result.stderr)
-            if mean_volume_match:
-                mean_volume = float(mean_volume_match.group(1))
-                # Шум обычно на 25-35 dB ниже среднего уровня
-                estimated_noise = mean_volume - 30
-                logger.debug(f"Оценка шума на основе mean_volume ({mean_volume} dB): {estimated_noise} dB")
-                return max(estimated_noise, -60.0)  # Не ниже -60 dB
-        
-        except Exception as e:
-            logger.debug(f"Не удалось оценить шум через volumedetect: {e}")
-        
-        logger.warning("Нет участков тишины для анализа шума, используем консервативную оценку")
-        return -45.0
+    noise_floor = levels.get('noise_floor')
     
-    # Берём первые несколько секунд тишины (обычно это intro без речи)
-    # или первые несколько участков
-    sample_segments = silence_segments[:3]  # Берём первые 3 участка
-    
-    # Если участки слишком короткие, расширяем выборку
-    total_duration = sum(end - start for start, end in sample_segments)
-    if total_duration < 1.0:  # Нужно минимум 1 секунда для анализа
-        sample_segments = silence_segments[:min(10, len(silence_segments))]
+    if noise_floor is not None:
+        # RMS самых тихих окон astats - измеренный уровень фонового шума
+        logger.debug(f"Оценка шума на основе astats (RMS trough): {noise_floor} dB")
+        return noise_floor  # Уже не ниже _NOISE_FLOOR_MIN_DB (см. _parse_combined_output)
     
     # Консервативная оценка на основе типичных значений
     # Обычно фоновый шум находится в диапазоне -40 до -60 dB
+    logger.warning("Уровень шума не измерен (нет данных astats или цифровая тишина), используем консервативную оценку")
     return -45.0
 
 
-def _estimate_speech_level(path: str, silence_segments: List[Tuple[float, float]], duration: Optional[float]) -> float:
+def _estimate_speech_level(levels: dict) -> float:
     """
-    Оценивает уровень речи из не-тихих участков.
+    Оценивает уровень речи по статистике volumedetect.
     
     Args:
-        path: Путь к медиафайлу
-        silence_segments: Участки тишины (чтобы исключить их)
-        duration: Общая длительность
+        levels: Результат _run_combined_analysis()
     
     Returns:
         Уровень речи в dB
     """
-    # Используем volumedetect для получения реального среднего уровня
-    try:
-        cmd = ["-i", path, "-af", "volumedetect", "-f", "null", "-"]
-        result = run_ffmpeg(cmd, log_level="error")
+    mean_volume = levels.get('mean_volume')
+    max_volume = levels.get('max_volume')
+    
+    if mean_volume is not None:
+        # Речь обычно близка к среднему уровню или немного выше
+        # Если есть пики, речь может быть громче
+        if max_volume is not None:
+            # Используем среднее между mean и max для оценки речи
+            speech_level = (mean_volume + max_volume) / 2
+        else:
+            speech_level = mean_volume
         
-        # Парсим mean_volume из stderr
-        mean_volume_match = re.search(r'mean_volume:\s*([-\d.]+)\s*dB', result.stderr)
-        max_volume_match = re.search(r'max_volume:\s*([-\d.]+)\s*dB', result.stderr)
-        
-        if mean_volume_match:
-            mean_volume = float(mean_volume_match.group(1))
-            # Речь обычно близка к среднему уровню или немного выше
-            # Если есть пики, речь может быть громче
-            if max_volume_match:
-                max_volume = float(max_volume_match.group(1))
-                # Используем среднее между mean и max для оценки речи
-                speech_level = (mean_volume + max_volume) / 2
-            else:
-                speech_level = mean_volume
-            
-            logger.debug(f"Оценка речи на основе volumedetect: {speech_level} dB")
-            return speech_level
-        
-    except Exception as e:
-        logger.debug(f"Не удалось оценить речь через volumedetect: {e}")
+        logger.debug(f"Оценка речи на основе volumedetect: {speech_level} dB")
+        return speech_level
+    
+    logger.debug("Не удалось оценить речь через volumedetect")
     
     # Консервативная оценка, если не удалось получить реальные данные
     return -18.0
 
 
-def _detect_music(noise_level_db: float, speech_level_db: float, silence_ratio: float) -> bool:
+def _detect_music(noise_level_db: float, speech_level_db: float, silence_ratio: Optional[float]) -> bool:
     """
     Эвристика для определения наличия музыки в аудио.
     
     Args:
         noise_level_db: Уровень шума
         speech_level_db: Уровень речи
-        silence_ratio: Доля тишины
+        silence_ratio: Доля тишины (None, если не измерялась)
     
     Returns:
         True, если вероятно присутствует музыка
@@ -276,7 +386,7 @@ def _detect_music(noise_level_db: float, speech_level_db: float, silence_ratio:
     
     # Если разница уровней мала (< 15 dB), возможно есть музыка
     # Если тишины очень мало (< 5%), вероятно музыка играет постоянно
-    if level_diff < 15 and silence_ratio < 0.05:
+    if level_diff < 15 and silence_ratio is not None and silence_ratio < 0.05:
         return True
     
     # Если разница уровней очень мала (< 10 dB), почти наверняка есть музыка
@@ -2,61 +2,218 @@
 Обёртка для выполнения команд ffmpeg и ffprobe.
 
 Предоставляет единый интерфейс для запуска команд с обработкой ошибок
-и логированием.
+и логированием. Процессы запускаются через asyncio: async-версии
+(run_ffmpeg_async, run_ffprobe_async) позволяют выполнять несколько команд
+одновременно в одном event loop, синхронные функции - обёртки над ними.
 """
+import asyncio
 import subprocess
 import logging
-import json
 import os
-from typing import Optional
+import re
+import sys
+from collections import deque
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+
+try:
+    # Необязательное ускорение: orjson разбирает JSON ffprobe в несколько раз
+    # быстрее. API loads() совпадает со стандартным json и тоже принимает bytes
+    import orjson as _json
+except ImportError:
+    import json as _json
 
 logger = logging.getLogger(__name__)
 
+# Сколько последних строк stderr хранить для сообщения об ошибке в потоковом режиме
+_STDERR_TAIL_LINES = 200
+# Размер блока при потоковом чтении stderr
+_READ_CHUNK_SIZE = 64 * 1024
+
+# Строки stderr с описанием ошибки (обычно содержат "Error", "Invalid", "No such file")
+# Bytes-шаблон: stderr разбирается без декодирования
+_ERROR_RE = re.compile(rb'error|invalid|no such file|cannot|failed', re.IGNORECASE)
+
+# Проверялась ли уже возможность ожидания процессов через pidfd
+_pidfd_watcher_checked = False
 
+
+@lru_cache(maxsize=1)
 def _get_ffmpeg_path() -> str:
-    """Получает путь к ffmpeg из переменной окружения или использует 'ffmpeg'."""
+    """Получает путь к ffmpeg из переменной окружения или использует 'ffmpeg' (читается один раз)."""
     return os.getenv('FFMPEG_PATH', 'ffmpeg')
 
 
+@lru_cache(maxsize=1)
 def _get_ffprobe_path() -> str:
-    """Получает путь к ffprobe из переменной окружения или использует 'ffprobe'."""
+    """Получает путь к ffprobe из переменной окружения или использует 'ffprobe' (читается один раз)."""
     return os.getenv('FFPROBE_PATH', 'ffprobe')
 
 
+def _use_pidfd_watcher() -> None:
+    """
+    Включает ожидание дочерних процессов asyncio через pidfd (Linux >= 5.3).
+    
+    В Python 3.11 asyncio по умолчанию ждёт каждый процесс в отдельном потоке
+    (ThreadedChildWatcher). Вместо этого pidfd процесса регистрируется
+    в селекторе event loop, и один поток ждёт сколько угодно ffmpeg.
+    В Python 3.12+ asyncio делает это сам, на других ОС и старых ядрах
+    остаётся стандартное ожидание.
+    """
+    global _pidfd_watcher_checked
+    if _pidfd_watcher_checked:
+        return
+    _pidfd_watcher_checked = True
+    
+    if sys.platform != 'linux' or sys.version_info >= (3, 12):
+        return
+    
+    try:
+        # Проверяем, что ядро поддерживает pidfd_open
+        os.close(os.pidfd_open(os.getpid()))
+    except (AttributeError, OSError):
+        return
+    
+    asyncio.set_child_watcher(_PidfdChildWatcher())
+    logger.debug("Ожидание процессов через pidfd")
+
+
+if sys.platform == 'linux' and sys.version_info < (3, 12):
+    class _PidfdChildWatcher(asyncio.AbstractChildWatcher):
+        """
+        Ожидание процессов через pidfd в том event loop, который их запустил.
+        
+        Стандартный asyncio.PidfdChildWatcher в 3.11 привязан к одному loop,
+        а run_ffmpeg/run_ffprobe создают свой loop на каждый вызов (в том
+        числе из рабочих потоков), поэтому loop берётся в момент запуска
+        процесса - так же, как это сделано в asyncio 3.12.
+        """
+        
+        def __init__(self):
+            self._pidfds = {}
+        
+        def add_child_handler(self, pid, callback, *args):
+            loop = asyncio.get_running_loop()
+            pidfd = os.pidfd_open(pid)
+            self._pidfds[pid] = (loop, pidfd)
+            # pidfd становится читаемым, когда процесс завершился
+            loop.add_reader(pidfd, self._do_wait, pid, callback, args)
+        
+        def remove_child_handler(self, pid):
+            entry = self._pidfds.pop(pid, None)
+            if entry is None:
+                return False
+            loop, pidfd = entry
+            loop.remove_reader(pidfd)
+            os.close(pidfd)
+            return True
+        
+        def _do_wait(self, pid, callback, args):
+            loop, pidfd = self._pidfds.pop(pid)
+            loop.remove_reader(pidfd)
+            os.close(pidfd)
+            try:
+                _, status = os.waitpid(pid, 0)
+            except ChildProcessError:
+                # Процесс уже кто-то дождался (waitpid в другом месте)
+                returncode = 255
+            else:
+                returncode = os.waitstatus_to_exitcode(status)
+            callback(pid, returncode, *args)
+        
+        def attach_loop(self, loop):
+            pass
+        
+        def is_active(self):
+            return True
+        
+        def close(self):
+            pass
+        
+        def __enter__(self):
+            return self
+        
+        def __exit__(self, exc_type, exc_value, exc_traceback):
+            pass
+
+
 class FFmpegError(Exception):
     """Исключение для ошибок выполнения ffmpeg/ffprobe."""
     pass
 
 
-def run_ffmpeg(cmd: list[str], log_level: str = "error") -> subprocess.CompletedProcess:
+def run_ffmpeg(
+    cmd: list[str],
+    log_level: str = "error",
+    stderr_callback: Optional[Callable[[bytes], Optional[bool]]] = None,
+    env: Optional[Dict[str, str]] = None
+) -> subprocess.CompletedProcess:
     """
-    Выполняет команду ffmpeg.
+    Выполняет команду ffmpeg (синхронная обёртка над run_ffmpeg_async).
+    
+    Запускает собственный event loop, поэтому не вызывается из уже
+    работающего loop - там нужно использовать run_ffmpeg_async().
     
     Args:
-        cmd: Список аргументов команды (первый элемент - 'ffmpeg')
+        cmd: Список аргументов команды (без 'ffmpeg' в начале)
         log_level: Уровень логирования ffmpeg (error, warning, info, debug)
+        stderr_callback: Если задан, каждая строка stderr (bytes, без перевода
+            строки) передаётся в callback по мере поступления. Если callback
+            вернул True, строка считается обработанной и не попадает в хвост
+            для сообщения об ошибке. Исключение из callback прерывает ffmpeg
+        env: Окружение процесса. Если None, наследуется текущее
     
     Returns:
-        CompletedProcess объект с результатами выполнения
+        CompletedProcess объект; stdout не сохраняется, в stderr - последние
+        _STDERR_TAIL_LINES строк вывода (bytes)
+    
+    Raises:
+        FFmpegError: Если выполнение завершилось с ошибкой
+    """
+    return asyncio.run(run_ffmpeg_async(cmd, log_level, stderr_callback, env))
+
+
+async def run_ffmpeg_async(
+    cmd: list[str],
+    log_level: str = "error",
+    stderr_callback: Optional[Callable[[bytes], Optional[bool]]] = None,
+    env: Optional[Dict[str, str]] = None
+) -> subprocess.CompletedProcess:
+    """
+    Выполняет команду ffmpeg, не блокируя event loop.
+    
+    Несколько вызовов можно выполнять одновременно (asyncio.gather) в одном
+    потоке: пока ffmpeg работает, loop обслуживает другие процессы.
+    
+    Args:
+        cmd: Список аргументов команды (без 'ffmpeg' в начале)
+        log_level: Уровень логирования ffmpeg (error, warning, info, debug)
+        stderr_callback: Если задан, каждая строка stderr (bytes, без перевода
+            строки) передаётся в callback по мере поступления. Если callback
+            вернул True, строка считается обработанной и не попадает в хвост
+            для сообщения об ошибке. Исключение из callback прерывает ffmpeg
+        env: Окружение процесса. Если None, наследуется текущее
+    
+    Returns:
+        CompletedProcess объект; stdout не сохраняется, в stderr - последние
+        _STDERR_TAIL_LINES строк вывода (bytes)
     
     Raises:
         FFmpegError: Если выполнение завершилось с ошибкой
     """
     # Добавляем уровень логирования в команду
-    # Используем subprocess без shell для безопасности и контроля
+    # Используем exec без shell для безопасности и контроля
     ffmpeg_path = _get_ffmpeg_path()
     full_cmd = [ffmpeg_path, "-loglevel", log_level] + cmd
     
-    logger.debug(f"Выполнение команды: {' '.join(full_cmd)}")
+    # Строка команды собирается только при включённом debug-логе
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Выполнение команды: %s", " ".join(full_cmd))
     
     try:
-        # Запускаем процесс и перехватываем stderr для анализа ошибок
-        result = subprocess.run(
-            full_cmd,
-            capture_output=True,
-            text=True,
-            check=False  # Не выбрасываем исключение автоматически, обрабатываем сами
-        )
+        # stderr читается по мере поступления; при долгом кодировании на уровне
+        # info он занимает мегабайты, а для ошибки нужен только хвост
+        result = await _run_streaming(full_cmd, stderr_callback, env)
         
         if result.returncode != 0:
             # Парсим stderr для поиска релевантной информации об ошибке
@@ -65,30 +222,170 @@ def run_ffmpeg(cmd: list[str], log_level: str = "error") -> subprocess.Completed
             raise FFmpegError(f"Команда ffmpeg завершилась с ошибкой: {error_msg}")
         
         # Логируем stderr даже при успехе, так как там может быть полезная информация
-        if result.stderr:
-            logger.debug(f"stderr ffmpeg: {result.stderr}")
+        # (декодируем только если debug-лог действительно включён)
+        if result.stderr and logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"stderr ffmpeg: {result.stderr.decode('utf-8', 'replace')}")
         
         return result
         
     except FileNotFoundError:
-        ffmpeg_path = _get_ffmpeg_path()
+        # ffmpeg_path уже вычислен выше - повторно не запрашиваем
         raise FFmpegError(
             f"ffmpeg не найден по пути '{ffmpeg_path}'. "
             "Убедитесь, что ffmpeg установлен и доступен в PATH, "
             "или установите переменную окружения FFMPEG_PATH"
         )
-    except subprocess.TimeoutExpired:
-        raise FFmpegError("Команда ffmpeg превысила время ожидания")
     except Exception as e:
         raise FFmpegError(f"Неожиданная ошибка при выполнении ffmpeg: {str(e)}")
 
 
-def run_ffprobe(cmd: list[str]) -> dict:
+async def _communicate(
+    full_cmd: list[str],
+    env: Optional[Dict[str, str]] = None
+) -> Tuple[int, bytes, bytes]:
+    """
+    Запускает процесс и дожидается завершения, собирая stdout и stderr.
+    
+    Если ожидание прервано (отмена задачи, Ctrl+C), процесс завершается и
+    дожидается, чтобы не оставлять ffmpeg работать в фоне (см. _kill()).
+    
+    Args:
+        full_cmd: Полная команда (с путём к исполняемому файлу)
+        env: Окружение процесса. Если None, наследуется текущее
+    
+    Returns:
+        Кортеж (код возврата, stdout, stderr)
+    """
+    _use_pidfd_watcher()
+    proc = await asyncio.create_subprocess_exec(
+        *full_cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=env
+    )
+    try:
+        stdout, stderr = await proc.communicate()
+    except BaseException:
+        await _kill(proc)
+        raise
+    return proc.returncode, stdout, stderr
+
+
+async def _run_streaming(
+    full_cmd: list[str],
+    stderr_callback: Optional[Callable[[bytes], Optional[bool]]] = None,
+    env: Optional[Dict[str, str]] = None
+) -> subprocess.CompletedProcess:
+    """
+    Запускает процесс и читает stderr построчно по мере поступления.
+    
+    Память расходуется только на хвост из последних _STDERR_TAIL_LINES строк,
+    которого достаточно для _parse_ffmpeg_error(), независимо от длительности
+    кодирования. stdout ffmpeg не используется и не читается. При прерывании
+    процесс завершается так же, как в _communicate().
+    
+    Args:
+        full_cmd: Полная команда (с путём к исполняемому файлу)
+        stderr_callback: Функция, вызываемая для каждой строки stderr (необязательно).
+            True в ответ - строка обработана и в хвост не добавляется
+        env: Окружение процесса. Если None, наследуется текущее
+    
+    Returns:
+        CompletedProcess, где stderr - последние строки вывода
+    """
+    tail = deque(maxlen=_STDERR_TAIL_LINES)
+    
+    _use_pidfd_watcher()
+    proc = await asyncio.create_subprocess_exec(
+        *full_cmd,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+        env=env
+    )
+    try:
+        async for line in _iter_lines(proc.stderr):
+            if stderr_callback is not None and stderr_callback(line):
+                continue
+            tail.append(line)
+        await proc.wait()
+    except BaseException:
+        await _kill(proc)
+        raise
+    
+    return subprocess.CompletedProcess(full_cmd, proc.returncode, stdout=None, stderr=b"\n".join(tail))
+
+
+async def _iter_lines(stream: asyncio.StreamReader) -> AsyncIterator[bytes]:
+    """
+    Построчно читает поток, разделяя строки по '\\n' и '\\r'.
+    
+    StreamReader.readline() ограничен 64 КБ на строку, а строки прогресса
+    ffmpeg разделяются только '\\r' и без перевода строки сливаются в одну.
+    Поэтому читаем блоками и режем сами; пустые строки пропускаются.
+    
+    Args:
+        stream: stdout/stderr процесса
+    
+    Yields:
+        Строки (bytes) без символов перевода строки
+    """
+    pending = b""
+    while True:
+        chunk = await stream.read(_READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        lines = (pending + chunk).splitlines(keepends=True)
+        # Последний кусок без перевода строки ждёт продолжения
+        pending = lines.pop() if not lines[-1].endswith((b"\n", b"\r")) else b""
+        for line in lines:
+            line = line.rstrip(b"\r\n")
+            if line:
+                yield line
+    if pending:
+        yield pending
+
+
+async def _kill(proc: asyncio.subprocess.Process) -> None:
+    """
+    Завершает процесс, если он ещё работает, и дожидается его.
+    
+    Ожидание нужно, чтобы транспорт процесса закрылся внутри своего event
+    loop, а не после его закрытия в asyncio.run().
+    """
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+    await proc.wait()
+
+
+def run_ffprobe(cmd: list[str], entries: Optional[str] = None) -> dict:
     """
-    Выполняет команду ffprobe и возвращает результат в виде словаря.
+    Выполняет команду ffprobe (синхронная обёртка над run_ffprobe_async).
     
     Args:
         cmd: Список аргументов команды (без 'ffprobe' в начале)
+        entries: Значение -show_entries (например, "stream=codec_type:format=duration").
+            Если None, выводятся все поля (-show_format -show_streams)
+    
+    Returns:
+        Словарь с результатами выполнения ffprobe (обычно JSON)
+    
+    Raises:
+        FFmpegError: Если выполнение завершилось с ошибкой или результат невалиден
+    """
+    return asyncio.run(run_ffprobe_async(cmd, entries))
+
+
+async def run_ffprobe_async(cmd: list[str], entries: Optional[str] = None) -> dict:
+    """
+    Выполняет команду ffprobe, не блокируя event loop.
+    
+    Args:
+        cmd: Список аргументов команды (без 'ffprobe' в начале)
+        entries: Значение -show_entries (например, "stream=codec_type:format=duration").
+            Если None, выводятся все поля (-show_format -show_streams)
     
     Returns:
         Словарь с результатами выполнения ffprobe (обычно JSON)
@@ -98,68 +395,63 @@ def run_ffprobe(cmd: list[str]) -> dict:
     """
     # ffprobe всегда используем с JSON выводом для структурированных данных
     ffprobe_path = _get_ffprobe_path()
-    full_cmd = [ffprobe_path, "-v", "error", "-print_format", "json", "-show_format", "-show_streams"] + cmd
+    # Только нужные поля: меньше JSON для разбора и меньше работы ffprobe
+    show_opts = ["-show_entries", entries] if entries else ["-show_format", "-show_streams"]
+    full_cmd = [ffprobe_path, "-v", "error", "-print_format", "json"] + show_opts + cmd
     
-    logger.debug(f"Выполнение команды: {' '.join(full_cmd)}")
+    # Строка команды собирается только при включённом debug-логе
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Выполнение команды: %s", " ".join(full_cmd))
     
     try:
-        result = subprocess.run(
-            full_cmd,
-            capture_output=True,
-            text=True,
-            check=False
-        )
+        returncode, stdout, stderr = await _communicate(full_cmd)
         
-        if result.returncode != 0:
-            error_msg = _parse_ffmpeg_error(result.stderr)
+        if returncode != 0:
+            error_msg = _parse_ffmpeg_error(stderr)
             logger.error(f"Ошибка ffprobe: {error_msg}")
             raise FFmpegError(f"Команда ffprobe завершилась с ошибкой: {error_msg}")
         
-        # Парсим JSON результат
+        # Парсим JSON результат (loads принимает bytes напрямую)
         try:
-            data = json.loads(result.stdout)
+            data = _json.loads(stdout)
             return data
-        except json.JSONDecodeError as e:
-            logger.error(f"Не удалось распарсить JSON от ffprobe: {result.stdout}")
+        except ValueError as e:  # json.JSONDecodeError и orjson.JSONDecodeError
+            logger.error(f"Не удалось распарсить JSON от ffprobe: {stdout.decode('utf-8', 'replace')}")
             raise FFmpegError(f"Невалидный JSON от ffprobe: {str(e)}")
         
     except FileNotFoundError:
-        ffprobe_path = _get_ffprobe_path()
+        # ffprobe_path уже вычислен выше - повторно не запрашиваем
         raise FFmpegError(
             f"ffprobe не найден по пути '{ffprobe_path}'. "
             "Убедитесь, что ffprobe установлен и доступен в PATH, "
             "или установите переменную окружения FFPROBE_PATH"
         )
-    except subprocess.TimeoutExpired:
-        raise FFmpegError("Команда ffprobe превысила время ожидания")
     except Exception as e:
         raise FFmpegError(f"Неожиданная ошибка при выполнении ffprobe: {str(e)}")
 
 
-def _parse_ffmpeg_error(stderr: str) -> str:
+def _parse_ffmpeg_error(stderr: bytes) -> str:
     """
     Парсит stderr от ffmpeg/ffprobe для извлечения понятного сообщения об ошибке.
     
     Args:
-        stderr: Текст stderr от процесса
+        stderr: Вывод stderr от процесса (bytes, без декодирования)
     
     Returns:
-        Понятное сообщение об ошибке
+        Понятное сообщение об ошибке (декодируется только найденная строка)
     """
     if not stderr:
         return "Неизвестная ошибка (stderr пуст)"
     
-    lines = stderr.strip().split('\n')
+    lines = stderr.strip().split(b'\n')
     
-    # Ищем строки с ошибками (обычно содержат "Error", "Invalid", "No such file")
-    error_lines = [
-        line for line in lines
-        if any(keyword in line.lower() for keyword in ['error', 'invalid', 'no such file', 'cannot', 'failed'])
-    ]
+    # Ищем строки с ошибками: один проход регулярного выражения по строке
+    # без создания копии в нижнем регистре
+    error_lines = [line for line in lines if _ERROR_RE.search(line)]
     
     if error_lines:
         # Возвращаем последнюю строку с ошибкой (обычно самая релевантная)
-        return error_lines[-1].strip()
+        return error_lines[-1].strip().decode('utf-8', 'replace')
     
     # Если не нашли явных ошибок, возвращаем последние строки stderr
-    return lines[-1].strip() if lines else "Неизвестная ошибка"
+    return lines[-1].strip().decode('utf-8', 'replace') if lines else "Неизвестная ошибка"
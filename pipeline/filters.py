@@ -36,6 +36,10 @@ from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
 
+# Значения по умолчанию, если анализ не дал уровней
+_DEFAULT_NOISE_DB = -45
+_DEFAULT_SPEECH_DB = -18
+
 
 def build_audio_filter(analysis: dict, preset: dict) -> str:
     """
@@ -73,7 +77,7 @@ def build_audio_filter(analysis: dict, preset: dict) -> str:
     noise_reduction = preset.get('noise_reduction', {})
     nr = _adapt_noise_reduction(
         noise_reduction.get('nr', 12),
-        analysis.get('noise_level_db', -45)
+        analysis.get('noise_level_db', _DEFAULT_NOISE_DB)
     )
     nt = noise_reduction.get('nt', 'w')
     # Используем максимальное шумоподавление
@@ -132,6 +136,9 @@ def build_audio_filter(analysis: dict, preset: dict) -> str:
     noise_gate = preset.get('noise_gate_threshold', -35)
     if noise_gate > -30:  # Если используется агрессивный режим
         # Добавляем второй, третий и четвертый highpass для максимального подавления
+        # Каскад намеренно не сворачивается в один highpass=...:poles=2: у
+        # одиночного фильтра спад ниже среза положе, и результат агрессивных
+        # пресетов изменился бы
         second_highpass = min(highpass_freq + 40, 290)
         third_highpass = min(highpass_freq + 80, 330)
         fourth_highpass = min(highpass_freq + 120, 370)
@@ -144,7 +151,7 @@ def build_audio_filter(analysis: dict, preset: dict) -> str:
     # Фильтры (особенно highpass/lowpass и компрессор) могут снизить общий уровень
     # Добавляем усиление для компенсации, но не слишком агрессивно
     # Адаптируем на основе разницы между речью и шумом
-    level_diff = analysis.get('speech_level_db', -18) - analysis.get('noise_level_db', -45)
+    level_diff = analysis.get('speech_level_db', _DEFAULT_SPEECH_DB) - analysis.get('noise_level_db', _DEFAULT_NOISE_DB)
     if level_diff > 20:
         # Хорошее соотношение сигнал/шум - умеренное усиление
         gain_db = 5.0
@@ -163,11 +170,45 @@ def build_audio_filter(analysis: dict, preset: dict) -> str:
     filter_chain = ",".join(filters)
     
     logger.info(f"Построена цепочка фильтров: {len(filters)} фильтров")
-    logger.debug(f"Полная цепочка: {filter_chain}")
+    logger.debug("Полная цепочка: %s", filter_chain)
     
     return filter_chain
 
 
+def analysis_signature(analysis: dict) -> tuple:
+    """
+    Возвращает ту часть результата анализа, от которой зависит цепочка фильтров.
+    
+    build_audio_filter() использует анализ только в двух решениях: диапазон
+    уровня шума (для afftdn) и соотношение речь/шум (для итогового усиления).
+    Анализы с одинаковой сигнатурой при одном пресете дают одинаковую
+    цепочку, поэтому сигнатуру можно использовать как ключ кэша.
+    
+    Args:
+        analysis: Результат analyze_audio()
+    
+    Returns:
+        Хешируемый кортеж (диапазон шума, хорошее ли соотношение сигнал/шум)
+    """
+    noise_level_db = analysis.get('noise_level_db', _DEFAULT_NOISE_DB)
+    speech_level_db = analysis.get('speech_level_db', _DEFAULT_SPEECH_DB)
+    return (_noise_band(noise_level_db), speech_level_db - noise_level_db > 20)
+
+
+def _noise_band(noise_level_db: float) -> int:
+    """
+    Определяет диапазон уровня шума.
+    
+    Returns:
+        -1 - очень тихий шум (< -50 dB), 1 - громкий (> -35 dB), 0 - обычный
+    """
+    if noise_level_db < -50:
+        return -1
+    elif noise_level_db > -35:
+        return 1
+    return 0
+
+
 def _adapt_noise_reduction(base_nr: float, noise_level_db: float) -> float:
     """
     Адаптирует уровень шумоподавления на основе фактического уровня шума.
@@ -181,9 +222,10 @@ def _adapt_noise_reduction(base_nr: float, noise_level_db: float) -> float:
     """
     # Если шум очень тихий (< -50 dB), уменьшаем шумоподавление
     # Если шум громкий (> -35 dB), увеличиваем
-    if noise_level_db < -50:
+    band = _noise_band(noise_level_db)
+    if band < 0:
         return max(3, base_nr * 0.7)  # Уменьшаем на 30%, но не меньше 3
-    elif noise_level_db > -35:
+    elif band > 0:
         return min(24, base_nr * 1.3)  # Увеличиваем на 30%, но не больше 24
     
     return base_nr
@@ -197,7 +239,12 @@ def _build_equalizer_string(entries: list) -> str:
         entries: Список кортежей (частота, усиление в dB)
     
     Returns:
-        Строка в формате: entry(100,0);entry(300,4);...
+        Строка в формате: entry(100,0);entry(300,4);... (по возрастанию частоты)
     """
+    # firequalizer интерполирует по точкам, упорядоченным по частоте: сортируем
+    # заранее, а для повторяющейся частоты оставляем последнее значение
+    # (так удобно переопределять точки при слиянии конфигураций)
+    entries = sorted({freq: gain for freq, gain in entries}.items())
+    
     eq_parts = [f"entry({freq},{gain})" for freq, gain in entries]
     return ";".join(eq_parts)
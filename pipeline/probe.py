@@ -8,14 +8,41 @@
 могут иметь разные характеристики, и адаптивная настройка фильтров
 требует точных данных о входном аудио.
 """
+import asyncio
+import hashlib
+import json
 import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple, Union
 
-from .ffmpeg import run_ffprobe, FFmpegError
+from .ffmpeg import run_ffmpeg, run_ffprobe, run_ffprobe_async, FFmpegError
 
 logger = logging.getLogger(__name__)
 
+# Сколько ответов ffprobe держать в памяти (дисковый кэш не ограничен)
+_PROBE_MEMORY_CACHE_SIZE = 128
+
+# Кэш ответов ffprobe в памяти: файл дискового кэша -> JSON (LRU).
+# Общий для get_streams_info() и get_streams_info_batch(); в batch к нему
+# обращаются из потоков asyncio.to_thread(), поэтому доступ под блокировкой
+_probe_memory_cache: "OrderedDict[Path, dict]" = OrderedDict()
+_probe_memory_lock = threading.Lock()
+
+# Поля ffprobe, которые использует _parse_probe_json() (-show_entries)
+_PROBE_ENTRIES = (
+    "stream=codec_type,codec_name,sample_rate,channels,bits_per_sample,sample_fmt,duration"
+    ":format=duration,format_name"
+)
+
+# astats (итоговая статистика): "Peak level dB: -1.2" / "RMS level dB: -20.5";
+# для тишины astats печатает -inf
+_ASTATS_LEVEL_RE = re.compile(rb'(Peak|RMS) level dB:\s*(-?(?:[\d.]+|inf))')
+
 
 class ProbeError(Exception):
     """Базовое исключение для ошибок модуля probe."""
@@ -32,12 +59,12 @@ class InvalidMediaFileError(ProbeError):
     pass
 
 
-def get_streams_info(path: str) -> dict:
+def get_streams_info(path: Union[str, os.PathLike]) -> dict:
     """
     Извлекает информацию о потоках (видео и аудио) из медиафайла.
     
     Args:
-        path: Путь к медиафайлу
+        path: Путь к медиафайлу (str или Path)
     
     Returns:
         Словарь с информацией о потоках:
@@ -63,6 +90,72 @@ def get_streams_info(path: str) -> dict:
         FFmpegError: Если файл не найден или не может быть прочитан
         ValueError: Если файл не содержит аудио потока
     """
+    path = _check_media_path(path)
+    logger.debug(f"Извлечение метаданных из: {path}")
+    
+    try:
+        data = _probe_raw(path)
+    except FFmpegError as e:
+        logger.error(f"Ошибка при извлечении метаданных: {e}")
+        raise
+    
+    return _parse_probe_json(data, path)
+
+
+async def get_streams_info_batch(paths: List[Union[str, os.PathLike]]) -> List[Union[dict, Exception]]:
+    """
+    Извлекает информацию о потоках для нескольких файлов одновременно.
+    
+    ffprobe запускаются параллельно в одном event loop, но не больше
+    os.cpu_count() процессов одновременно. Ошибка одного файла не прерывает
+    остальные.
+    
+    Args:
+        paths: Пути к медиафайлам (str или Path)
+    
+    Returns:
+        Список в порядке paths: для каждого файла результат в формате
+        get_streams_info() или исключение, которое она бы выбросила
+    """
+    semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+    
+    def _check_and_lookup(path: Union[str, os.PathLike]) -> Tuple[str, Optional[Path], Optional[dict]]:
+        path = _check_media_path(path)
+        return (path, *_lookup_probe_cache(path))
+    
+    async def _probe_one(path: Union[str, os.PathLike]) -> dict:
+        # stat и чтение кэша блокируют, поэтому выполняются в потоке и вне
+        # семафора: он ограничивает только число одновременных ffprobe
+        path, cache_file, data = await asyncio.to_thread(_check_and_lookup, path)
+        if data is None:
+            async with semaphore:
+                logger.debug(f"Извлечение метаданных из: {path}")
+                try:
+                    data = await run_ffprobe_async(["-i", path], entries=_PROBE_ENTRIES)
+                except FFmpegError as e:
+                    logger.error(f"Ошибка при извлечении метаданных: {e}")
+                    raise
+            await asyncio.to_thread(_store_probe_cache, cache_file, data)
+        return _parse_probe_json(data, path)
+    
+    return await asyncio.gather(*(_probe_one(path) for path in paths), return_exceptions=True)
+
+
+def _check_media_path(path: Union[str, os.PathLike]) -> str:
+    """
+    Проверяет, что путь указывает на существующий файл.
+    
+    Args:
+        path: Путь к медиафайлу (str или Path)
+    
+    Returns:
+        Путь в виде строки (приводится один раз и дальше переиспользуется)
+    
+    Raises:
+        FileNotFoundError: Если файл не найден
+        ValueError: Если путь не является файлом
+    """
+    path = os.fspath(path)
     file_path = Path(path)
     
     # Валидация существования файла
@@ -72,12 +165,166 @@ def get_streams_info(path: str) -> dict:
     if not file_path.is_file():
         raise ValueError(f"Указанный путь не является файлом: {path}")
     
-    logger.debug(f"Извлечение метаданных из: {path}")
+    return path
+
+
+def _probe_raw(path: str) -> dict:
+    """
+    Возвращает JSON-ответ ffprobe для файла, по возможности из кэша.
     
-    try:
+    Кэш двухуровневый: в памяти процесса (LRU на _PROBE_MEMORY_CACHE_SIZE
+    записей) и на диске (см. _probe_cache_dir()). Ключ включает mtime и размер
+    файла, поэтому изменённый файл probe-ится заново. Запрашиваются только
+    поля _PROBE_ENTRIES.
+    
+    Args:
+        path: Путь к существующему медиафайлу
+    
+    Returns:
+        Разобранный JSON от ffprobe. Словарь общий для всех вызовов
+        с тем же ключом - не изменяйте его
+    
+    Raises:
+        FFmpegError: Если ffprobe завершился с ошибкой
+    """
+    cache_file, data = _lookup_probe_cache(path)
+    if data is None:
         # Используем ffprobe для получения структурированной информации
-        data = run_ffprobe(["-i", str(file_path)])
-        
+        data = run_ffprobe(["-i", path], entries=_PROBE_ENTRIES)
+        _store_probe_cache(cache_file, data)
+    return data
+
+
+def _lookup_probe_cache(path: str) -> Tuple[Optional[Path], Optional[dict]]:
+    """
+    Ищет ответ ffprobe в кэше: сначала в памяти, затем на диске.
+    
+    Функция блокирующая (stat и чтение файла): из async-кода её вызывают
+    через asyncio.to_thread().
+    
+    Args:
+        path: Путь к медиафайлу
+    
+    Returns:
+        Кортеж (файл дискового кэша, JSON или None при промахе). Файл кэша
+        равен None, если stat не удался - тогда кэш не используется
+    """
+    cache_file = _probe_cache_file(path)
+    if cache_file is None:
+        return None, None
+    
+    with _probe_memory_lock:
+        data = _probe_memory_cache.get(cache_file)
+        if data is not None:
+            _probe_memory_cache.move_to_end(cache_file)
+            return cache_file, data
+    
+    data = _read_probe_cache(cache_file)
+    if data is not None:
+        _remember_probe(cache_file, data)
+    return cache_file, data
+
+
+def _store_probe_cache(cache_file: Optional[Path], data: dict) -> None:
+    """Сохраняет ответ ffprobe в оба уровня кэша (блокирующая: пишет на диск)."""
+    if cache_file is None:
+        return
+    _remember_probe(cache_file, data)
+    _write_probe_cache(cache_file, data)
+
+
+def _remember_probe(cache_file: Path, data: dict) -> None:
+    """Кладёт ответ ffprobe в кэш в памяти, вытесняя самую старую запись."""
+    with _probe_memory_lock:
+        _probe_memory_cache[cache_file] = data
+        _probe_memory_cache.move_to_end(cache_file)
+        if len(_probe_memory_cache) > _PROBE_MEMORY_CACHE_SIZE:
+            _probe_memory_cache.popitem(last=False)
+
+
+def _probe_cache_dir() -> Path:
+    """Каталог дискового кэша ffprobe: $XDG_CACHE_HOME/voice-cleaner/probe."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return Path(cache_home) / 'voice-cleaner' / 'probe'
+
+
+def _probe_cache_file(path: str) -> Optional[Path]:
+    """
+    Возвращает файл дискового кэша для (абсолютный путь, mtime, размер, поля).
+    
+    Этот же путь служит ключом кэша в памяти.
+    
+    Args:
+        path: Путь к медиафайлу
+    
+    Returns:
+        Путь к JSON в кэше или None, если stat не удался
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    
+    # Набор полей входит в ключ: при его изменении старые ответы не подходят
+    key = f"{os.path.abspath(path)}\0{st.st_mtime_ns}\0{st.st_size}\0{_PROBE_ENTRIES}"
+    return _probe_cache_dir() / f"{hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest()}.json"
+
+
+def _read_probe_cache(cache_file: Optional[Path]) -> Optional[dict]:
+    """Читает ответ ffprobe из дискового кэша; None при промахе или битом файле."""
+    if cache_file is None:
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    logger.debug(f"Метаданные из кэша: {cache_file}")
+    return data
+
+
+def _write_probe_cache(cache_file: Optional[Path], data: dict) -> None:
+    """
+    Сохраняет ответ ffprobe в дисковый кэш.
+    
+    Запись атомарная (временный файл + os.replace), чтобы параллельные
+    процессы не прочитали недописанный JSON. Ошибки записи не критичны:
+    кэш просто не пополняется.
+    """
+    if cache_file is None:
+        return
+    tmp_path = None
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_file.parent, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, cache_file)
+    except OSError as e:
+        logger.debug(f"Не удалось записать кэш ffprobe {cache_file}: {e}")
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def _parse_probe_json(data: dict, path: str) -> dict:
+    """
+    Строит результат get_streams_info() из JSON-ответа ffprobe.
+    
+    Args:
+        data: Разобранный JSON от ffprobe (поля _PROBE_ENTRIES)
+        path: Путь к файлу (для сообщений об ошибках)
+    
+    Returns:
+        Словарь в формате get_streams_info()
+    
+    Raises:
+        NoAudioStreamError: Если файл не содержит аудио потока
+        InvalidMediaFileError: Если метаданные имеют неожиданный формат
+    """
+    try:
         # Извлекаем информацию о потоках
         streams = data.get('streams', [])
         format_info = data.get('format', {})
@@ -131,26 +378,24 @@ def get_streams_info(path: str) -> dict:
         if video_info:
             result['video'] = video_info
         
-        logger.debug(f"Метаданные извлечены: {result}")
+        # Ленивое форматирование: repr словаря строится только для debug-лога
+        logger.debug("Метаданные извлечены: %s", result)
         return result
         
-    except FFmpegError as e:
-        logger.error(f"Ошибка при извлечении метаданных: {e}")
-        raise
     except (KeyError, ValueError, TypeError) as e:
         logger.error(f"Ошибка парсинга метаданных: {e}")
         raise InvalidMediaFileError(f"Не удалось извлечь метаданные из файла: {path}. Возможно, файл повреждён или имеет неожиданный формат.")
 
 
-def get_audio_stats(path: str) -> dict:
+def get_audio_stats(path: Union[str, os.PathLike]) -> dict:
     """
     Извлекает статистику аудио (peak, RMS) с помощью astats фильтра.
     
     Args:
-        path: Путь к медиафайлу
+        path: Путь к медиафайлу (str или Path)
     
     Returns:
-        Словарь со статистикой:
+        Словарь со статистикой (значения None, если astats их не вывел):
         {
             'peak_db': float,  # Пиковый уровень в dB
             'rms_db': float,   # RMS уровень в dB
@@ -161,41 +406,40 @@ def get_audio_stats(path: str) -> dict:
     Raises:
         FFmpegError: Если не удалось выполнить команду
     """
+    path = os.fspath(path)
     logger.debug(f"Извлечение статистики аудио из: {path}")
     
+    # astats печатает итоговую статистику при завершении на уровне info.
+    # -vn/-sn: видео и субтитры не декодируются, -nostats/-hide_banner:
+    # без строк прогресса и баннера
+    cmd = [
+        "-nostats",
+        "-hide_banner",
+        "-i", path,
+        "-vn", "-sn",
+        "-af", "astats",
+        "-f", "null",
+        "-"
+    ]
+    
+    # Сохраняем только строки с уровнями: для многоканального файла
+    # итоговая статистика может не поместиться в хвост stderr
+    level_lines = []
+    
+    def _collect(line: bytes) -> None:
+        if _ASTATS_LEVEL_RE.search(line):
+            level_lines.append(line)
+    
     try:
-        # Используем astats для получения статистики
-        # Формат вывода: JSON для удобного парсинга
-        cmd = [
-            "-i", str(path),
-            "-af", "astats=metadata=1:reset=1",
-            "-f", "null",
-            "-"
-        ]
-        
-        # Запускаем ffmpeg для получения статистики
-        # Используем отдельный вызов через ffprobe с фильтром
-        # На самом деле, для astats нужно использовать ffmpeg, но через наш wrapper
-        from .ffmpeg import run_ffmpeg
-        
-        # Альтернативный подход: используем silencedetect для получения уровней
-        # Но для полной статистики лучше использовать отдельный вызов ffmpeg
-        # Пока используем упрощённый подход через анализ потока
-        
-        # Для получения точной статистики нужно запустить ffmpeg с astats
-        # и парсить вывод. Это делается в модуле analysis, здесь возвращаем базовые значения
-        result = run_ffmpeg(cmd, log_level="error")
-        
-        # Парсим stderr для извлечения статистики
-        # astats выводит информацию в stderr в специальном формате
-        stats = _parse_astats_output(result.stderr)
-        
-        logger.debug(f"Статистика аудио: {stats}")
-        return stats
-        
+        run_ffmpeg(cmd, log_level="info", stderr_callback=_collect)
     except FFmpegError as e:
         logger.error(f"Ошибка при извлечении статистики: {e}")
         raise
+    
+    stats = _parse_astats_output(b"\n".join(level_lines))
+    
+    logger.debug(f"Статистика аудио: {stats}")
+    return stats
 
 
 def _extract_bit_depth(stream: dict) -> Optional[int]:
@@ -226,22 +470,40 @@ def _extract_bit_depth(stream: dict) -> Optional[int]:
     return None
 
 
-def _parse_astats_output(stderr: str) -> dict:
+def _parse_astats_output(stderr: bytes) -> dict:
     """
     Парсит вывод astats из stderr ffmpeg.
     
+    astats печатает статистику по каждому каналу, затем секцию Overall,
+    поэтому последнее совпадение каждого уровня относится ко всему потоку.
+    
     Args:
-        stderr: Вывод stderr от ffmpeg с astats
+        stderr: Вывод stderr от ffmpeg с astats (bytes)
     
     Returns:
-        Словарь со статистикой
+        Словарь со статистикой в формате get_audio_stats()
     """
-    # По умолчанию возвращаем None значения
-    # Полный парсинг astats сложен, поэтому используем упрощённый подход
-    # Детальная статистика будет получена в модуле analysis
+    peak_db = None
+    rms_db = None
+    
+    # Один проход регулярного выражения по всему буферу
+    for match in _ASTATS_LEVEL_RE.finditer(stderr):
+        kind, value = match.groups()
+        if kind == b'Peak':
+            peak_db = float(value)
+        else:
+            rms_db = float(value)
+    
     return {
-        'peak_db': None,
-        'rms_db': None,
-        'peak_level': None,
-        'rms_level': None
+        'peak_db': peak_db,
+        'rms_db': rms_db,
+        'peak_level': _db_to_linear(peak_db),
+        'rms_level': _db_to_linear(rms_db)
     }
+
+
+def _db_to_linear(db: Optional[float]) -> Optional[float]:
+    """Переводит уровень из dB в линейную амплитуду (-inf dB -> 0.0)."""
+    if db is None:
+        return None
+    return 10 ** (db / 20)
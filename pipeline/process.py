@@ -22,26 +22,59 @@
 - При использовании неправильных флагов синхронизации
 """
 import logging
+import os
+import re
+import shutil
 from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple, Union
 
 from .ffmpeg import run_ffmpeg, FFmpegError
 
 logger = logging.getLogger(__name__)
 
+# Число потоков ffmpeg на один файл при пакетной обработке. Файлы
+# обрабатываются параллельно в нескольких процессах, поэтому ffmpeg
+# не должен занимать все ядра сам
+FFMPEG_THREADS = 2
 
-def process_video(input_path: str, output_path: str, filter_chain: str) -> None:
+# Строка отчёта -progress: "key=value" (frame=, out_time_ms=, progress=).
+# Проверяется только ключ: часть значений ffmpeg выравнивает пробелами
+# ("bitrate= 128.0kbits/s", "speed=   1x")
+_PROGRESS_LINE_RE = re.compile(rb'[a-z_0-9]+=.*')
+# Позиция в выходном файле. Несмотря на имя, out_time_ms - в микросекундах
+# (исторически так в ffmpeg); есть во всех версиях, в отличие от out_time_us
+_OUT_TIME_RE = re.compile(rb'out_time_ms=(\d+)')
+
+
+def process_video(
+    input_path: Union[str, os.PathLike],
+    output_path: Union[str, os.PathLike],
+    filter_chain: str,
+    threads: int = 0,
+    progress_callback: Optional[Callable[[float], None]] = None
+) -> None:
     """
     Обрабатывает видео, применяя фильтры к аудио с сохранением A/V синхронизации.
     
     Args:
-        input_path: Путь к входному видеофайлу
-        output_path: Путь к выходному файлу
-        filter_chain: Цепочка фильтров в формате ffmpeg
+        input_path: Путь к входному видеофайлу (str или Path)
+        output_path: Путь к выходному файлу (str или Path)
+        filter_chain: Цепочка фильтров в формате ffmpeg. Пустая цепочка
+            означает, что обработка не нужна: файл копируется без запуска ffmpeg
+        threads: Число потоков ffmpeg для декодирования и кодирования.
+            0 - ffmpeg выбирает сам (для одиночного файла); при параллельной
+            обработке нескольких файлов задаётся явно
+        progress_callback: Если задан, вызывается с обработанной длительностью
+            в секундах по мере кодирования (отчёт ffmpeg -progress). Исключение
+            из callback прерывает ffmpeg - так можно остановить зависшую обработку
     
     Raises:
         FFmpegError: Если обработка завершилась с ошибкой
         FileNotFoundError: Если входной файл не найден
     """
+    # Приводим пути к строкам один раз: они же идут в команду ffmpeg
+    input_path = os.fspath(input_path)
+    output_path = os.fspath(output_path)
     input_file = Path(input_path)
     output_file = Path(output_path)
     
@@ -55,10 +88,26 @@ def process_video(input_path: str, output_path: str, filter_chain: str) -> None:
     # Создаём выходную директорию, если не существует
     output_file.parent.mkdir(parents=True, exist_ok=True)
     
+    if not filter_chain.strip():
+        # Фильтров нет - перемультиплексирование ничего бы не изменило,
+        # поэтому просто копируем файл без запуска ffmpeg
+        shutil.copyfile(input_path, output_path)
+        logger.info(f"Цепочка фильтров пуста, файл скопирован: {output_file.name}")
+        return
+    
     # Строим команду ffmpeg
     # Ключевые флаги для синхронизации:
+    # Ограничение потоков ставится и перед входом (декодирование), и перед
+    # выходом (фильтры и кодирование) - у ffmpeg это разные опции
+    threads_opt = ["-threads", str(threads)] if threads > 0 else []
+    
+    # Отчёт о прогрессе: пары key=value в stderr вместо строки статистики
+    progress_opt = ["-progress", "pipe:2", "-nostats"] if progress_callback is not None else []
+    
     cmd = [
-        "-i", str(input_file),  # Входной файл
+        *progress_opt,
+        *threads_opt,
+        "-i", input_path,  # Входной файл
         
         # Видео: копируем без изменений
         "-map", "0:v:0",  # Берём первый видео поток
@@ -78,14 +127,21 @@ def process_video(input_path: str, output_path: str, filter_chain: str) -> None:
         # Обрезаем по самому короткому потоку (на случай несоответствия длительностей)
         "-shortest",
         
+        # Ограничиваем число потоков, чтобы параллельные воркеры не конкурировали за ядра
+        *threads_opt,
+        
         # Выходной файл
         "-y",  # Перезаписывать без запроса
-        str(output_file)
+        output_path
     ]
     
     try:
         logger.debug(f"Выполнение команды ffmpeg для обработки видео")
-        result = run_ffmpeg(cmd, log_level="error")
+        result = run_ffmpeg(
+            cmd,
+            log_level="error",
+            stderr_callback=_progress_parser(progress_callback) if progress_callback is not None else None
+        )
         
         # Проверяем, что выходной файл создан
         if not output_file.exists():
@@ -112,6 +168,94 @@ def process_video(input_path: str, output_path: str, filter_chain: str) -> None:
         raise FFmpegError(f"Ошибка обработки видео: {str(e)}")
 
 
+def _progress_parser(progress_callback: Callable[[float], None]) -> Callable[[bytes], bool]:
+    """
+    Возвращает обработчик строк stderr, разбирающий отчёт ffmpeg -progress.
+    
+    Строки отчёта поглощаются (в хвост stderr для сообщения об ошибке не
+    попадают), остальные строки - обычный вывод ffmpeg - пропускаются дальше.
+    
+    Args:
+        progress_callback: Получает обработанную длительность в секундах
+    
+    Returns:
+        Функция для stderr_callback в run_ffmpeg()
+    """
+    def _on_line(line: bytes) -> bool:
+        if not _PROGRESS_LINE_RE.fullmatch(line):
+            return False
+        match = _OUT_TIME_RE.fullmatch(line)
+        if match:
+            progress_callback(int(match.group(1)) / 1_000_000)
+        return True
+    
+    return _on_line
+
+
+def process_videos_batch(
+    jobs: List[Tuple[Union[str, os.PathLike], Union[str, os.PathLike], str]],
+    max_workers: Optional[int] = None
+) -> Iterator[Tuple[str, Optional[Exception]]]:
+    """
+    Обрабатывает несколько видео параллельно в пуле процессов.
+    
+    Цепочка фильтров - это последовательность IIR-фильтров, и ffmpeg не
+    загружает ими больше пары ядер, поэтому независимые файлы выгоднее
+    обрабатывать одновременно. Ядра делятся между воркерами: каждый ffmpeg
+    получает -threads = ядра // воркеры.
+    
+    Args:
+        jobs: Список кортежей (входной путь, выходной путь, цепочка фильтров)
+        max_workers: Число одновременных процессов. По умолчанию половина ядер
+    
+    Yields:
+        Кортежи (выходной путь, исключение или None) в порядке завершения
+    """
+    if not jobs:
+        return
+    
+    # Ленивый импорт: concurrent.futures.process тянет multiprocessing
+    # (десятки мс на старте), а нужен только пакетной обработке
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    
+    cores = os.cpu_count() or 1
+    if max_workers is None:
+        max_workers = max(1, cores // 2)
+    max_workers = min(max_workers, len(jobs))
+    threads = max(1, cores // max_workers)
+    
+    logger.info(f"Пакетная обработка: {len(jobs)} файлов, {max_workers} процессов по {threads} потоков ffmpeg")
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(process_video, input_path, output_path, filter_chain, threads): os.fspath(output_path)
+            for input_path, output_path, filter_chain in jobs
+        }
+        
+        for future in as_completed(futures):
+            output_path = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                # process_video сам удаляет частичный файл при ошибке ffmpeg
+                # (FFmpegError), а при FileNotFoundError ffmpeg не запускался.
+                # Остальное - падение воркера, после него файл мог остаться
+                if not isinstance(e, (FFmpegError, FileNotFoundError)):
+                    _remove_partial(output_path)
+                yield output_path, e
+            else:
+                yield output_path, None
+
+
+def _remove_partial(output_path: str) -> None:
+    """Удаляет частично созданный выходной файл, если он есть."""
+    try:
+        os.unlink(output_path)
+        logger.debug(f"Удалён частично созданный файл: {output_path}")
+    except OSError:
+        pass
+
+
 def validate_output(input_path: str, output_path: str) -> bool:
     """
     Валидирует выходной файл: проверяет существование и длительность.